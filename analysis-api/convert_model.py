@@ -0,0 +1,31 @@
+import joblib
+from skl2onnx import convert_sklearn
+from skl2onnx.common import tree_ensemble
+from skl2onnx.common.data_types import FloatTensorType
+
+N_FEATURES = 8
+
+_add_node = tree_ensemble.add_node
+
+def _add_node_int_missing(*args, nodes_missing_value_tracks_true=0, **kwargs):
+    # skl2onnx passes HistGradientBoosting's boolean missing_go_to_left into an
+    # ONNX ints attribute, which onnx rejects; store it as 0/1 instead.
+    return _add_node(*args, nodes_missing_value_tracks_true=int(nodes_missing_value_tracks_true), **kwargs)
+
+tree_ensemble.add_node = _add_node_int_missing
+
+def convert_model(model_path='url_threat_model.joblib', onnx_path='url_threat_model.onnx'):
+    model = joblib.load(model_path)
+    
+    onnx_model = convert_sklearn(
+        model,
+        initial_types=[('X', FloatTensorType([None, N_FEATURES]))],
+        options={type(model): {'zipmap': False}}
+    )
+    
+    with open(onnx_path, 'wb') as f:
+        f.write(onnx_model.SerializeToString())
+    print(f"ONNX model saved to {onnx_path}")
+
+if __name__ == "__main__":
+    convert_model()
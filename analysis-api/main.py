@@ -1,20 +1,55 @@
 import os
+import re
 import math
 import json
 import uuid
+import time
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
 import tldextract
-import requests
+import ahocorasick
+import httpx
+import redis.asyncio as aioredis
+from cachetools import TTLCache
 import joblib
 import numpy as np
+import numba
+from numba import njit, prange
 from datetime import datetime
-from typing import List, Dict, Any
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from typing import List, Dict, Any, Optional
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query
+from pydantic import BaseModel, field_validator
 from fastapi.middleware.cors import CORSMiddleware
 import firebase_admin
 from firebase_admin import credentials, firestore
 
-app = FastAPI(title="Ransomware Early Warning System API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=100),
+        timeout=httpx.Timeout(10.0, connect=2.0)
+    )
+    _TLD("https://example.com")
+    app.state.redis = aioredis.from_url(REDIS_URL, decode_responses=True) if REDIS_URL else None
+    app.state.token_bucket = app.state.redis.register_script(TOKEN_BUCKET_LUA) if REDIS_URL else None
+    app.state.scan_queue = asyncio.Queue(maxsize=SCAN_QUEUE_SIZE)
+    app.state.scan_writer = asyncio.create_task(scan_writer(app.state.scan_queue))
+    try:
+        yield
+    finally:
+        try:
+            await asyncio.wait_for(app.state.scan_queue.join(), timeout=5)
+        except asyncio.TimeoutError:
+            print(f"Dropping {app.state.scan_queue.qsize()} unsaved scans on shutdown")
+        app.state.scan_writer.cancel()
+        await app.state.http.aclose()
+        if app.state.redis is not None:
+            await app.state.redis.aclose()
+
+app = FastAPI(title="Ransomware Early Warning System API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,6 +61,16 @@ app.add_middleware(
 
 GOOGLE_SAFE_BROWSING_API_KEY = os.environ.get("GOOGLE_SAFE_BROWSING_API_KEY", "")
 VIRUSTOTAL_API_KEY = os.environ.get("VIRUSTOTAL_API_KEY", "")
+REDIS_URL = os.environ.get("REDIS_URL", "")
+GSB_RATE_PER_MIN = float(os.environ.get("GSB_RATE_PER_MIN", "600"))
+VT_RATE_PER_MIN = float(os.environ.get("VT_RATE_PER_MIN", "4"))
+TLDEXTRACT_CACHE_DIR = os.environ.get("TLDEXTRACT_CACHE_DIR", ".tld_cache")
+
+_TLD = tldextract.TLDExtract(
+    suffix_list_urls=(),
+    cache_dir=TLDEXTRACT_CACHE_DIR,
+    include_psl_private_domains=False
+)
 
 try:
     import google.cloud.firestore
@@ -45,124 +90,365 @@ except Exception as e:
     firestore_client = None
 
 try:
-    model = joblib.load('url_threat_model.joblib')
+    from google.cloud.firestore_v1.base_query import FieldFilter
+except ImportError:
+    FieldFilter = None
+
+MODEL_PATH = 'url_threat_model.joblib'
+ONNX_MODEL_PATH = 'url_threat_model.onnx'
+
+try:
+    model = joblib.load(MODEL_PATH)
     print("ML model loaded successfully")
-except:
-    print("ML model not found, will generate synthetic predictions")
+except Exception as e:
+    print(f"ML model not loaded ({e}), will generate synthetic predictions")
     model = None
 
+try:
+    if os.path.exists(MODEL_PATH) and os.path.getmtime(ONNX_MODEL_PATH) < os.path.getmtime(MODEL_PATH):
+        raise RuntimeError(f"{ONNX_MODEL_PATH} is older than {MODEL_PATH}; re-run convert_model.py")
+    import onnxruntime as ort
+    sess_options = ort.SessionOptions()
+    sess_options.intra_op_num_threads = int(os.environ.get("ONNX_INTRA_OP_THREADS", "1"))
+    onnx_session = ort.InferenceSession(ONNX_MODEL_PATH, sess_options, providers=['CPUExecutionProvider'])
+    print("ONNX model loaded successfully")
+except Exception as e:
+    print(f"ONNX model not loaded, using joblib model: {e}")
+    onnx_session = None
+
+def model_available() -> bool:
+    return onnx_session is not None or model is not None
+
+def predict_proba(X: np.ndarray) -> np.ndarray:
+    if onnx_session is not None:
+        return onnx_session.run(None, {'X': X})[1]
+    return model.predict_proba(X)
+
+@njit(cache=True, fastmath=True)
+def _entropy_u8(buf: np.ndarray) -> float:
+    counts = np.zeros(256, np.int64)
+    for b in buf:
+        counts[b] += 1
+    n = buf.size
+    entropy = 0.0
+    for i in range(256):
+        c = counts[i]
+        if c > 0:
+            p = c / n
+            entropy -= p * math.log2(p)
+    return entropy
+
+def encode_url(url: str) -> bytes:
+    # surrogatepass keeps lone surrogates (valid in a JSON string) encodable.
+    return url.encode('utf-8', 'surrogatepass')
+
 def calculate_entropy(url: str) -> float:
-    if not url:
-        return 0
-    prob = [float(url.count(c)) / len(url) for c in set(url)]
-    return -sum(p * math.log2(p) for p in prob if p > 0)
+    buf = np.frombuffer(encode_url(url), dtype=np.uint8)
+    return float(_entropy_u8(buf)) if buf.size else 0.0
 
-def extract_features(url: str) -> Dict[str, float]:
+calculate_entropy("https://example.com")
+
+SUSPICIOUS_KEYWORDS = ('encrypt', 'decrypt', 'secure', 'update', 'verify', 'account', 'login', 'free', 'download', 'wallet', 'crypto', 'bitcoin', 'password', 'banking', 'invoice', 'payment', 'support', 'confirm', 'unlock')
+
+SUSPICIOUS_TLDS = frozenset(['ru', 'cn', 'tk', 'xyz', 'top', 'pw', 'cc', 'ws', 'info', 'work', 'click', 'link', 'loan', 'date', 'racing', 'gq', 'ml', 'ga', 'cf'])
+
+_IP_RE = re.compile(r'^(?:\d{1,3}\.){3}\d{1,3}$|^[0-9a-f]*:[0-9a-f:.]*$')
+
+KW_AUTOMATON = ahocorasick.Automaton()
+for kw in SUSPICIOUS_KEYWORDS:
+    KW_AUTOMATON.add_word(kw, kw)
+KW_AUTOMATON.make_automaton()
+
+def extract_string_features(url: str) -> Dict[str, float]:
     try:
-        extracted = tldextract.extract(url)
-        domain = extracted.domain or ""
+        extracted = _TLD(url)
         suffix = extracted.suffix or ""
         subdomain = extracted.subdomain or ""
     except:
-        domain = ""
         suffix = ""
         subdomain = ""
     
-    url_length = len(url)
-    dot_count = url.count('.')
-    
-    has_ip = 0
     try:
-        if '/' in url:
-            host_part = url.split('/')[2] if len(url.split('/')) > 2 else url.split('/')[0]
-            parts = host_part.replace('.', '').replace(':', '')
-            if parts.isdigit() and len(parts) >= 7:
-                has_ip = 1
-    except:
-        pass
+        host = urlsplit(url if '://' in url else '//' + url).hostname
+    except ValueError:
+        host = None
+    has_ip = 1 if host and _IP_RE.match(host) else 0
     
-    has_https = 1 if url.startswith('https://') else 0
+    keyword_count = len({kw for _, kw in KW_AUTOMATON.iter(url.lower())})
     
-    suspicious_keywords_list = ['encrypt', 'decrypt', 'secure', 'update', 'verify', 'account', 'login', 'free', 'download', 'wallet', 'crypto', 'bitcoin', 'password', 'banking', 'invoice', 'payment', 'support', 'confirm', 'unlock']
-    keyword_count = sum(1 for kw in suspicious_keywords_list if kw.lower() in url.lower())
-    
-    suspicious_tlds = ['ru', 'cn', 'tk', 'xyz', 'top', 'pw', 'cc', 'ws', 'info', 'work', 'click', 'link', 'loan', 'date', 'racing', 'gq', 'ml', 'ga', 'cf']
-    tld_risk_score = 1.0 if suffix.lower() in suspicious_tlds else 0.0
+    tld_risk_score = 1.0 if suffix.lower() in SUSPICIOUS_TLDS else 0.0
     
     subdomain_count = subdomain.count('.') + 1 if subdomain else 0
     
-    entropy = calculate_entropy(url)
-    
     return {
-        'url_length': url_length,
-        'dot_count': dot_count,
         'has_ip': has_ip,
-        'has_https': has_https,
         'suspicious_keywords': keyword_count,
         'tld_risk_score': tld_risk_score,
-        'subdomain_count': subdomain_count,
-        'entropy': entropy
+        'subdomain_count': subdomain_count
+    }
+
+def extract_features(url: str) -> Dict[str, float]:
+    string_features = extract_string_features(url)
+    
+    return {
+        'url_length': len(url),
+        'dot_count': url.count('.'),
+        'has_ip': string_features['has_ip'],
+        'has_https': int(url.startswith('https://')),
+        'suspicious_keywords': string_features['suspicious_keywords'],
+        'tld_risk_score': string_features['tld_risk_score'],
+        'subdomain_count': string_features['subdomain_count'],
+        'entropy': calculate_entropy(url)
     }
 
+_HTTPS_PREFIX = np.frombuffer(b'https://', dtype=np.uint8)
+_DOT = ord('.')
+# One thread per worker by default; the Procfile already runs several workers per host.
+FEATURIZE_NUM_THREADS = max(1, min(
+    int(os.environ.get("FEATURIZE_NUM_THREADS", "1")),
+    numba.config.NUMBA_NUM_THREADS
+))
+
+@njit(parallel=True, cache=True)
+def _featurize_numeric(data: np.ndarray, offsets: np.ndarray, prefix: np.ndarray, out: np.ndarray) -> None:
+    for i in prange(len(offsets) - 1):
+        start, end = offsets[i], offsets[i + 1]
+        
+        dots = 0
+        for j in range(start, end):
+            if data[j] == _DOT:
+                dots += 1
+        
+        has_https = 0
+        if end - start >= prefix.size:
+            has_https = 1
+            for j in range(prefix.size):
+                if data[start + j] != prefix[j]:
+                    has_https = 0
+                    break
+        
+        out[i, 0] = dots
+        out[i, 1] = has_https
+        out[i, 2] = _entropy_u8(data[start:end]) if end > start else 0.0
+
+numba.set_num_threads(FEATURIZE_NUM_THREADS)
+_featurize_numeric(_HTTPS_PREFIX, np.array([0, _HTTPS_PREFIX.size], dtype=np.int64), _HTTPS_PREFIX, np.empty((1, 3)))
+
+def extract_features_batch(urls: List[str]) -> List[Dict[str, float]]:
+    encoded = [encode_url(url) for url in urls]
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    
+    numeric = np.empty((len(urls), 3), dtype=np.float64)
+    # Numba's thread count is per calling thread, so set it where the kernel runs.
+    numba.set_num_threads(FEATURIZE_NUM_THREADS)
+    _featurize_numeric(data, offsets, _HTTPS_PREFIX, numeric)
+    
+    features_list = []
+    for url, (dots, has_https, entropy) in zip(urls, numeric):
+        string_features = extract_string_features(url)
+        features_list.append({
+            'url_length': len(url),
+            'dot_count': int(dots),
+            'has_ip': string_features['has_ip'],
+            'has_https': int(has_https),
+            'suspicious_keywords': string_features['suspicious_keywords'],
+            'tld_risk_score': string_features['tld_risk_score'],
+            'subdomain_count': string_features['subdomain_count'],
+            'entropy': float(entropy)
+        })
+    return features_list
+
+FEATURE_ORDER = (
+    'url_length',
+    'dot_count',
+    'has_ip',
+    'has_https',
+    'suspicious_keywords',
+    'tld_risk_score',
+    'subdomain_count',
+    'entropy'
+)
+
+def build_feature_matrix(features_list: List[Dict[str, float]], dtype=np.float32) -> np.ndarray:
+    return np.fromiter(
+        (features[key] for features in features_list for key in FEATURE_ORDER),
+        dtype=dtype,
+        count=len(features_list) * len(FEATURE_ORDER)
+    ).reshape(-1, len(FEATURE_ORDER))
+
+INDICATOR_RULES = (
+    ('url_length', lambda v: v > 80, 0.15, False, "Unusually long URL"),
+    ('dot_count', lambda v: v > 4, 0.1, False, "Excessive subdomains/dots"),
+    ('has_ip', lambda v: v > 0, 0.25, False, "IP address detected instead of domain"),
+    ('has_https', lambda v: v == 0, 0.1, False, "No HTTPS encryption"),
+    ('suspicious_keywords', lambda v: v > 0, 0.1, True, "Suspicious keywords detected ({value} found)"),
+    ('tld_risk_score', lambda v: v > 0, 0.2, False, "High-risk TLD detected"),
+    ('subdomain_count', lambda v: v > 3, 0.1, False, "Excessive subdomain depth"),
+    ('entropy', lambda v: v > 5.0, 0.15, False, "High URL entropy (obfuscation indicator)")
+)
+
+_RULE_COLUMNS = np.array([FEATURE_ORDER.index(key) for key, *_ in INDICATOR_RULES])
+_RULE_WEIGHTS = np.array([weight for _, _, weight, _, _ in INDICATOR_RULES])
+_RULE_PER_UNIT = np.array([per_unit for _, _, _, per_unit, _ in INDICATOR_RULES])
+
+def evaluate_rules(features: Dict[str, float]) -> tuple:
+    score = 0.0
+    indicators = []
+    for key, predicate, weight, per_unit, message in INDICATOR_RULES:
+        value = features[key]
+        if predicate(value):
+            score += weight * value if per_unit else weight
+            indicators.append(message.format(value=value))
+    return min(score, 1.0), indicators
+
+def rule_scores_batch(X: np.ndarray) -> np.ndarray:
+    values = X[:, _RULE_COLUMNS]
+    contributions = np.where(_RULE_PER_UNIT, values * _RULE_WEIGHTS, _RULE_WEIGHTS)
+    scores = np.zeros(len(values))
+    # Accumulate rule by rule so the float sums match evaluate_rules exactly.
+    for i, (_, predicate, _, _, _) in enumerate(INDICATOR_RULES):
+        scores += np.where(predicate(values[:, i]), contributions[:, i], 0.0)
+    return scores.clip(max=1.0)
+
+def predict_threat_batch(features_list: List[Dict[str, float]]) -> List[tuple]:
+    if not features_list:
+        return []
+    
+    if not model_available():
+        X = build_feature_matrix(features_list, dtype=np.float64)
+        return [(float(score), "Medium") for score in rule_scores_batch(X)]
+    
+    probs = predict_proba(build_feature_matrix(features_list))
+    threat_scores = probs[:, 1]
+    margin = np.abs(probs[:, 0] - probs[:, 1])
+    confidences = np.select([margin > 0.4, margin > 0.2], ["High", "Medium"], default="Low")
+    
+    return [(float(score), str(confidence)) for score, confidence in zip(threat_scores, confidences)]
+
 def predict_threat(features: Dict[str, float]) -> tuple:
-    if model is not None:
-        feature_array = np.array([[
-            features['url_length'],
-            features['dot_count'],
-            features['has_ip'],
-            features['has_https'],
-            features['suspicious_keywords'],
-            features['tld_risk_score'],
-            features['subdomain_count'],
-            features['entropy']
-        ]])
-        prob = model.predict_proba(feature_array)[0]
+    if model_available():
+        feature_array = build_feature_matrix([features])
+        prob = predict_proba(feature_array)[0]
         threat_score = float(prob[1])
         confidence = "High" if abs(prob[0] - prob[1]) > 0.4 else "Medium" if abs(prob[0] - prob[1]) > 0.2 else "Low"
     else:
-        threat_score = 0.0
-        indicators = []
-        
-        if features['url_length'] > 80:
-            threat_score += 0.15
-            indicators.append("Unusually long URL")
-        
-        if features['dot_count'] > 4:
-            threat_score += 0.1
-            indicators.append("Excessive subdomains")
-        
-        if features['has_ip']:
-            threat_score += 0.25
-            indicators.append("IP address in URL")
-        
-        if features['has_https'] == 0:
-            threat_score += 0.1
-            indicators.append("No HTTPS encryption")
-        
-        if features['suspicious_keywords'] > 0:
-            threat_score += features['suspicious_keywords'] * 0.1
-            indicators.append(f"Suspicious keywords detected ({features['suspicious_keywords']} found)")
-        
-        if features['tld_risk_score'] > 0:
-            threat_score += 0.2
-            indicators.append("High-risk TLD detected")
-        
-        if features['subdomain_count'] > 3:
-            threat_score += 0.1
-            indicators.append("Excessive subdomain depth")
-        
-        if features['entropy'] > 5.0:
-            threat_score += 0.15
-            indicators.append("High URL entropy (obfuscation indicator)")
-        
-        threat_score = min(threat_score, 1.0)
+        threat_score, _ = evaluate_rules(features)
         confidence = "Medium"
     
     return threat_score, confidence
 
-def get_google_safe_browsing(url: str) -> Dict[str, Any]:
+_gsb_cache = TTLCache(maxsize=10_000, ttl=900)
+_vt_cache = TTLCache(maxsize=10_000, ttl=3600)
+_gsb_inflight: Dict[str, asyncio.Task] = {}
+_vt_inflight: Dict[str, asyncio.Task] = {}
+
+def normalize_url(url: str) -> str:
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url
+    key = f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path or '/'}"
+    if parts.query:
+        key += f"?{parts.query}"
+    return key
+
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return allowed
+"""
+
+RATE_LIMITED = {"enabled": False, "result": "rate-limited"}
+
+async def acquire_token(name: str, rate_per_min: float) -> bool:
+    if app.state.token_bucket is None:
+        return True
+    
+    try:
+        allowed = await app.state.token_bucket(
+            keys=[f"rl:{name}"],
+            args=[rate_per_min / 60, max(rate_per_min, 1), time.time()]
+        )
+        return bool(allowed)
+    except Exception as e:
+        print(f"Rate limiter error: {e}")
+        return True
+
+async def shared_cache_get(name: str, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+    if app.state.redis is None or not keys:
+        return {}
+    
+    try:
+        values = await app.state.redis.mget([f"cache:{name}:{key}" for key in keys])
+        return {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+    except Exception as e:
+        print(f"Redis cache error: {e}")
+        return {}
+
+async def shared_cache_set(name: str, entries: Dict[str, Dict[str, Any]], ttl: int) -> None:
+    if app.state.redis is None or not entries:
+        return
+    
+    try:
+        async with app.state.redis.pipeline(transaction=False) as pipe:
+            for key, value in entries.items():
+                pipe.set(f"cache:{name}:{key}", json.dumps(value), ex=ttl, nx=True)
+            await pipe.execute()
+    except Exception as e:
+        print(f"Redis cache error: {e}")
+
+async def _load_through_caches(name: str, cache: TTLCache, key: str, url: str, fetch) -> Dict[str, Any]:
+    result = (await shared_cache_get(name, [key])).get(key)
+    if result is not None:
+        cache[key] = result
+        return result
+    
+    result = await fetch(url)
+    if result.get("enabled"):
+        cache[key] = result
+        await shared_cache_set(name, {key: result}, int(cache.ttl))
+    return result
+
+async def cached_lookup(name: str, cache: TTLCache, inflight: Dict[str, asyncio.Task], url: str, fetch) -> Dict[str, Any]:
+    key = normalize_url(url)
+    result = cache.get(key)
+    if result is not None:
+        return result
+    
+    # Concurrent misses for the same URL share one in-flight lookup, whether it succeeds or not.
+    task = inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_load_through_caches(name, cache, key, url, fetch))
+        inflight[key] = task
+        
+        def _forget(done: asyncio.Task) -> None:
+            if inflight.get(key) is done:
+                del inflight[key]
+        
+        task.add_done_callback(_forget)
+    
+    return await asyncio.shield(task)
+
+async def _fetch_google_safe_browsing(urls: List[str]) -> Dict[str, Dict[str, Any]]:
     if not GOOGLE_SAFE_BROWSING_API_KEY:
-        return {"enabled": False, "result": "API key not configured"}
+        return {url: {"enabled": False, "result": "API key not configured"} for url in urls}
+    
+    if not await acquire_token("gsb", GSB_RATE_PER_MIN):
+        return {url: RATE_LIMITED for url in urls}
     
     try:
         api_url = f"https://safebrowsing.googleapis.com/v4/threatMatches:find?key={GOOGLE_SAFE_BROWSING_API_KEY}"
@@ -175,26 +461,69 @@ def get_google_safe_browsing(url: str) -> Dict[str, Any]:
                 "threatTypes": ["MALWARE", "SOCIAL_ENGINEERING", "UNWANTED_SOFTWARE"],
                 "platformTypes": ["ANY_PLATFORM"],
                 "threatEntryTypes": ["URL"],
-                "threatEntries": [{"url": url}]
+                "threatEntries": [{"url": url} for url in urls]
             }
         }
-        response = requests.post(api_url, json=payload, timeout=5)
+        response = await app.state.http.post(api_url, json=payload, timeout=httpx.Timeout(5.0, connect=2.0))
         if response.status_code == 200:
             data = response.json()
-            return {"enabled": True, "matches": data.get("matches", [])}
+            matches_by_url = {url: [] for url in urls}
+            for match in data.get("matches", []):
+                matched_url = match.get("threat", {}).get("url")
+                if matched_url in matches_by_url:
+                    matches_by_url[matched_url].append(match)
+            return {url: {"enabled": True, "matches": matches} for url, matches in matches_by_url.items()}
     except Exception as e:
-        return {"enabled": False, "error": str(e)}
+        return {url: {"enabled": False, "error": str(e)} for url in urls}
     
-    return {"enabled": False, "result": "clean"}
+    return {url: {"enabled": False, "result": "clean"} for url in urls}
+
+async def get_google_safe_browsing_batch(urls: List[str]) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for url in urls:
+        cached = _gsb_cache.get(normalize_url(url))
+        if cached is not None:
+            results[url] = cached
+    
+    misses = list(dict.fromkeys(url for url in urls if url not in results))
+    shared = await shared_cache_get("gsb", list({normalize_url(url) for url in misses}))
+    for url in misses:
+        cached = shared.get(normalize_url(url))
+        if cached is not None:
+            _gsb_cache[normalize_url(url)] = cached
+            results[url] = cached
+    
+    misses = [url for url in misses if url not in results]
+    if misses:
+        fetched = await _fetch_google_safe_browsing(misses)
+        to_share = {}
+        for url, result in fetched.items():
+            if result.get("enabled"):
+                _gsb_cache[normalize_url(url)] = result
+                to_share[normalize_url(url)] = result
+        await shared_cache_set("gsb", to_share, int(_gsb_cache.ttl))
+        results.update(fetched)
+    
+    return results
+
+async def _fetch_google_safe_browsing_single(url: str) -> Dict[str, Any]:
+    results = await _fetch_google_safe_browsing([url])
+    return results[url]
+
+async def get_google_safe_browsing(url: str) -> Dict[str, Any]:
+    return await cached_lookup("gsb", _gsb_cache, _gsb_inflight, url, _fetch_google_safe_browsing_single)
 
-def get_virustotal_analysis(url: str) -> Dict[str, Any]:
+async def _fetch_virustotal_analysis(url: str) -> Dict[str, Any]:
     if not VIRUSTOTAL_API_KEY:
         return {"enabled": False, "result": "API key not configured"}
     
+    if not await acquire_token("vt", VT_RATE_PER_MIN):
+        return RATE_LIMITED
+    
     try:
         headers = {"x-apikey": VIRUSTOTAL_API_KEY}
-        response = requests.get(f"https://www.virustotal.com/api/v3/urls", 
-                              params={"url": url}, headers=headers, timeout=10)
+        response = await app.state.http.get(f"https://www.virustotal.com/api/v3/urls",
+                                            params={"url": url}, headers=headers)
         if response.status_code == 200:
             data = response.json()
             return {"enabled": True, "data": data}
@@ -203,36 +532,18 @@ def get_virustotal_analysis(url: str) -> Dict[str, Any]:
     
     return {"enabled": False, "result": "clean"}
 
-def analyze_url(url: str) -> Dict[str, Any]:
-    features = extract_features(url)
-    threat_score, confidence = predict_threat(features)
-    
-    indicators = []
+async def get_virustotal_analysis(url: str) -> Dict[str, Any]:
+    return await cached_lookup("vt", _vt_cache, _vt_inflight, url, _fetch_virustotal_analysis)
+
+def build_analysis(url: str, features: Dict[str, float], threat_score: float, confidence: str,
+                   gsb_result: Dict[str, Any], vt_result: Dict[str, Any]) -> Dict[str, Any]:
+    _, indicators = evaluate_rules(features)
     
-    if features['url_length'] > 80:
-        indicators.append("Unusually long URL")
-    if features['dot_count'] > 4:
-        indicators.append("Excessive subdomains/dots")
-    if features['has_ip']:
-        indicators.append("IP address detected instead of domain")
-    if features['has_https'] == 0:
-        indicators.append("No HTTPS encryption")
-    if features['suspicious_keywords'] > 0:
-        indicators.append(f"Suspicious keywords detected ({features['suspicious_keywords']} found)")
-    if features['tld_risk_score'] > 0:
-        indicators.append("High-risk TLD detected")
-    if features['subdomain_count'] > 3:
-        indicators.append("Excessive subdomain depth")
-    if features['entropy'] > 5.0:
-        indicators.append("High URL entropy (obfuscation indicator)")
-    
-    gsb_result = get_google_safe_browsing(url)
     if gsb_result.get("enabled") and gsb_result.get("matches"):
         threat_score = min(threat_score + 0.3, 1.0)
         indicators.append("Flagged by Google Safe Browsing")
         confidence = "High"
     
-    vt_result = get_virustotal_analysis(url)
     if vt_result.get("enabled"):
         indicators.append("Analyzed by VirusTotal")
     
@@ -267,43 +578,165 @@ def analyze_url(url: str) -> Dict[str, Any]:
         "virusTotal": vt_result
     }
 
+async def analyze_url(url: str) -> Dict[str, Any]:
+    features = extract_features(url)
+    threat_score, confidence = predict_threat(features)
+    
+    gsb_result, vt_result = await asyncio.gather(
+        get_google_safe_browsing(url),
+        get_virustotal_analysis(url)
+    )
+    
+    return build_analysis(url, features, threat_score, confidence, gsb_result, vt_result)
+
+async def analyze_urls(urls: List[str]) -> List[Dict[str, Any]]:
+    features_list = extract_features_batch(urls)
+    predictions = predict_threat_batch(features_list)
+    
+    gsb_results, vt_results = await asyncio.gather(
+        get_google_safe_browsing_batch(urls),
+        asyncio.gather(*(get_virustotal_analysis(url) for url in urls))
+    )
+    
+    return [
+        build_analysis(url, features, threat_score, confidence, gsb_results[url], vt_result)
+        for url, features, (threat_score, confidence), vt_result
+        in zip(urls, features_list, predictions, vt_results)
+    ]
+
+def build_scan_record(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "scanId": str(uuid.uuid4()),
+        "url": result["url"],
+        "threatScore": result["threatScore"],
+        "threatLevel": result["threatLevel"],
+        "confidence": result["confidence"],
+        "indicators": result["indicators"],
+        "recommendation": result["recommendation"],
+        "safeToVisit": result["safeToVisit"],
+        "createdAt": datetime.utcnow().isoformat()
+    }
+
+def save_scans_batch(scans: List[Dict[str, Any]]) -> None:
+    batch = firestore_client.batch()
+    collection = firestore_client.collection("url_scans")
+    for scan_data in scans:
+        batch.set(collection.document(scan_data["scanId"]), scan_data)
+    batch.commit()
+
+SCAN_QUEUE_SIZE = 10_000
+SCAN_FLUSH_INTERVAL = 0.05
+MAX_WRITE_BATCH = 500
+
+async def scan_writer(queue: asyncio.Queue) -> None:
+    while True:
+        scans = [await queue.get()]
+        await asyncio.sleep(SCAN_FLUSH_INTERVAL)
+        while len(scans) < MAX_WRITE_BATCH and not queue.empty():
+            scans.append(queue.get_nowait())
+        
+        try:
+            await asyncio.to_thread(save_scans_batch, scans)
+            print(f"Saved {len(scans)} scans to Firestore")
+        except Exception as e:
+            print(f"Firestore save error: {e}")
+        finally:
+            for _ in scans:
+                queue.task_done()
+
+async def persist_scans(scans: List[Dict[str, Any]]) -> None:
+    if not firestore_client:
+        return
+    
+    queue = app.state.scan_queue
+    for i, scan_data in enumerate(scans):
+        try:
+            queue.put_nowait(scan_data)
+        except asyncio.QueueFull:
+            print(f"Scan queue full, writing {len(scans) - i} scans directly")
+            try:
+                await asyncio.to_thread(save_scans_batch, scans[i:])
+            except Exception as e:
+                print(f"Firestore save error: {e}")
+            return
+
+MAX_BATCH_URLS = 500
+
+_SURROGATE_RE = re.compile('[\ud800-\udfff]')
+
+def replace_lone_surrogates(url: str) -> str:
+    # JSON allows lone surrogate escapes, but they cannot be encoded as UTF-8 for the
+    # response body, Firestore or the threat intel APIs.
+    return _SURROGATE_RE.sub('\ufffd', url)
+
 class URLRequest(BaseModel):
     url: str
+    
+    @field_validator('url')
+    @classmethod
+    def _valid_unicode(cls, url: str) -> str:
+        return replace_lone_surrogates(url)
+
+class URLBatchRequest(BaseModel):
+    urls: List[str]
+    
+    @field_validator('urls')
+    @classmethod
+    def _valid_unicode(cls, urls: List[str]) -> List[str]:
+        return [replace_lone_surrogates(url) for url in urls]
 
 @app.get("/health")
-def health_check():
+def health_check() -> Dict[str, str]:
     return {"status": "ok", "service": "Ransomware Early Warning System"}
 
 @app.post("/analyze-url")
-def analyze_url_endpoint(request: URLRequest):
+async def analyze_url_endpoint(request: URLRequest, background_tasks: BackgroundTasks) -> Dict[str, Any]:
     try:
-        result = analyze_url(request.url)
-        
-        scan_data = {
-            "scanId": str(uuid.uuid4()),
-            "url": result["url"],
-            "threatScore": result["threatScore"],
-            "threatLevel": result["threatLevel"],
-            "confidence": result["confidence"],
-            "indicators": result["indicators"],
-            "recommendation": result["recommendation"],
-            "safeToVisit": result["safeToVisit"],
-            "createdAt": datetime.utcnow().isoformat()
-        }
-        
-        if firestore_client:
-            try:
-                firestore_client.collection("url_scans").document(scan_data["scanId"]).set(scan_data)
-                print(f"Scan saved to Firestore: {scan_data['scanId']}")
-            except Exception as e:
-                print(f"Firestore save error: {e}")
-        
+        result = await analyze_url(request.url)
+        background_tasks.add_task(persist_scans, [build_scan_record(result)])
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/analyze-urls")
+async def analyze_urls_endpoint(request: URLBatchRequest, background_tasks: BackgroundTasks) -> List[Dict[str, Any]]:
+    if not request.urls:
+        raise HTTPException(status_code=400, detail="No URLs provided")
+    if len(request.urls) > MAX_BATCH_URLS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_URLS} URLs can be analyzed per request")
+    
+    try:
+        results = await analyze_urls(request.urls)
+        background_tasks.add_task(persist_scans, [build_scan_record(result) for result in results])
+        return results
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+THREAT_LEVELS = ("Safe", "Suspicious", "High Risk")
+
+def count_scans(threat_level: str = None) -> int:
+    query = firestore_client.collection("url_scans")
+    if threat_level is not None:
+        if FieldFilter is not None:
+            query = query.where(filter=FieldFilter("threatLevel", "==", threat_level))
+        else:
+            query = query.where("threatLevel", "==", threat_level)
+    return query.count().get()[0][0].value
+
+async def count_scans_aggregated() -> tuple:
+    return tuple(await asyncio.gather(
+        asyncio.to_thread(count_scans),
+        *(asyncio.to_thread(count_scans, level) for level in THREAT_LEVELS)
+    ))
+
+def count_scans_streaming() -> tuple:
+    counts = Counter()
+    for s in firestore_client.collection("url_scans").select(["threatLevel"]).stream():
+        counts[s.to_dict().get("threatLevel")] += 1
+    return (sum(counts.values()), *(counts[level] for level in THREAT_LEVELS))
+
 @app.get("/analytics")
-def get_analytics():
+async def get_analytics() -> Dict[str, int]:
     if not firestore_client:
         return {
             "totalScans": 0,
@@ -313,12 +746,11 @@ def get_analytics():
         }
     
     try:
-        scans = list(firestore_client.collection("url_scans").stream())
-        
-        total = len(scans)
-        safe = sum(1 for s in scans if s.to_dict().get("threatLevel") == "Safe")
-        suspicious = sum(1 for s in scans if s.to_dict().get("threatLevel") == "Suspicious")
-        high_risk = sum(1 for s in scans if s.to_dict().get("threatLevel") == "High Risk")
+        try:
+            total, safe, suspicious, high_risk = await count_scans_aggregated()
+        except Exception as e:
+            print(f"Aggregation query failed, streaming threat levels instead: {e}")
+            total, safe, suspicious, high_risk = await asyncio.to_thread(count_scans_streaming)
         
         return {
             "totalScans": total,
@@ -335,24 +767,54 @@ def get_analytics():
             "highRiskCount": 0
         }
 
+MAX_HISTORY_PAGE = 100
+
+def encode_history_cursor(created_at: str, doc_id: str) -> str:
+    return f"{created_at}|{doc_id}"
+
+def decode_history_cursor(cursor: str) -> tuple:
+    created_at, sep, doc_id = cursor.partition("|")
+    if not sep or not created_at or not doc_id or "/" in doc_id or doc_id in (".", ".."):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, doc_id
+
 @app.get("/scan-history")
-def get_scan_history(limit: int = 50):
+def get_scan_history(limit: int = Query(50, ge=1, le=MAX_HISTORY_PAGE), after: Optional[str] = None) -> Dict[str, Any]:
     if not firestore_client:
-        return []
+        return {"items": [], "nextCursor": None}
+    
+    collection = firestore_client.collection("url_scans")
+    start_after = None
+    if after:
+        created_at, doc_id = decode_history_cursor(after)
+        try:
+            start_after = {"createdAt": created_at, "__name__": collection.document(doc_id)}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
     
     try:
-        scans = firestore_client.collection("url_scans") \
+        query = collection \
             .order_by("createdAt", direction=firestore.Query.DESCENDING) \
-            .limit(limit) \
-            .stream()
+            .order_by("__name__", direction=firestore.Query.DESCENDING)
+        if start_after:
+            query = query.start_after(start_after)
         
-        return [s.to_dict() for s in scans]
+        items = []
+        last = None
+        for s in query.limit(limit).stream():
+            items.append(s.to_dict())
+            last = s
+        
+        next_cursor = None
+        if len(items) == limit:
+            next_cursor = encode_history_cursor(items[-1].get("createdAt"), last.id)
+        return {"items": items, "nextCursor": next_cursor}
     except Exception as e:
         print(f"Scan history error: {e}")
-        return []
+        return {"items": [], "nextCursor": None}
 
 @app.delete("/scan-history/{scan_id}")
-def delete_scan(scan_id: str):
+def delete_scan(scan_id: str) -> Dict[str, str]:
     if not firestore_client:
         raise HTTPException(status_code=500, detail="Firestore not available")
     
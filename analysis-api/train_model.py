@@ -1,10 +1,9 @@
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import HistGradientBoostingClassifier
 from sklearn.model_selection import train_test_split
 import joblib
 import math
-import random
 import tldextract
 
 def calculate_entropy(url):
@@ -59,46 +58,34 @@ def extract_features(url):
         'entropy': entropy
     }
 
-def generate_synthetic_dataset(n_samples=2000):
-    data = []
-    labels = []
-    
-    for _ in range(n_samples):
-        is_malicious = random.random() < 0.4
-        
-        if is_malicious:
-            url_length = random.randint(60, 200)
-            dot_count = random.randint(3, 10)
-            has_ip = random.choice([0, 1, 1])
-            has_https = random.choice([0, 1])
-            keyword_count = random.randint(1, 5)
-            tld_risk_score = random.choice([0, 0, 1])
-            subdomain_count = random.randint(2, 8)
-            entropy = random.uniform(4.0, 6.5)
-        else:
-            url_length = random.randint(20, 80)
-            dot_count = random.randint(1, 3)
-            has_ip = 0
-            has_https = random.choice([0, 1])
-            keyword_count = random.randint(0, 1)
-            tld_risk_score = 0
-            subdomain_count = random.randint(0, 2)
-            entropy = random.uniform(2.0, 4.5)
-        
-        data.append([
-            url_length, dot_count, has_ip, has_https,
-            keyword_count, tld_risk_score, subdomain_count, entropy
-        ])
-        labels.append(1 if is_malicious else 0)
-    
-    return np.array(data), np.array(labels)
+def generate_synthetic_dataset(n_samples=2000, seed=42):
+    rng = np.random.default_rng(seed)
+    is_malicious = rng.random(n_samples) < 0.4
+    
+    url_length = np.where(is_malicious, rng.integers(60, 201, n_samples), rng.integers(20, 81, n_samples))
+    dot_count = np.where(is_malicious, rng.integers(3, 11, n_samples), rng.integers(1, 4, n_samples))
+    has_ip = np.where(is_malicious, rng.random(n_samples) < 2 / 3, 0)
+    has_https = rng.integers(0, 2, n_samples)
+    keyword_count = np.where(is_malicious, rng.integers(1, 6, n_samples), rng.integers(0, 2, n_samples))
+    tld_risk_score = np.where(is_malicious, rng.random(n_samples) < 1 / 3, 0)
+    subdomain_count = np.where(is_malicious, rng.integers(2, 9, n_samples), rng.integers(0, 3, n_samples))
+    entropy = np.where(is_malicious, rng.uniform(4.0, 6.5, n_samples), rng.uniform(2.0, 4.5, n_samples))
+    
+    data = np.column_stack([
+        url_length, dot_count, has_ip, has_https,
+        keyword_count, tld_risk_score, subdomain_count, entropy
+    ]).astype(np.float64)
+    labels = is_malicious.astype(np.int64)
+    
+    return data, labels
 
 def train_model():
     X, y = generate_synthetic_dataset(2000)
+    X = X.astype(np.float32)
     
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
-    model = RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42)
+    model = HistGradientBoostingClassifier(max_iter=200, max_depth=6, learning_rate=0.1, random_state=42)
     model.fit(X_train, y_train)
     
     accuracy = model.score(X_test, y_test)